@@ -31,7 +31,7 @@ from testCaseGeneratorLib.defaultData import defaultTestData, defaultSFNTTestDat
 from testCaseGeneratorLib.sfnt import packSFNT, getSFNTData, getSFNTCollectionData, getTTFont
 from testCaseGeneratorLib.paths import resourcesDirectory, authoringToolDirectory, authoringToolTestDirectory,\
                                        authoringToolResourcesDirectory, sfntTTFSourcePath, sfntTTFCompositeSourcePath
-from testCaseGeneratorLib.html import generateAuthoringToolIndexHTML, expandSpecLinks
+from testCaseGeneratorLib.html import generateAuthoringToolIndexHTML, expandSpecLinks, writeLines
 from testCaseGeneratorLib.utilities import calcPaddingLength, calcTableChecksum
 from testCaseGeneratorLib.sharedCases import makeLSB1
 from testCaseGeneratorLib.sharedCases import makeGlyfOverlapBitmapSFNT, makeGlyfNoOverlapBitmapSFNT
@@ -829,9 +829,7 @@ for tag, title, url, note in groupDefinitions:
 path = os.path.join(authoringToolDirectory, "manifest.txt")
 if os.path.exists(path):
     os.remove(path)
-f = open(path, "w")
-f.write("\n".join(manifest))
-f.close()
+writeLines(path, manifest)
 
 # -----------------------
 # Check for Unknown Files
@@ -31,7 +31,7 @@ from testCaseGeneratorLib.sfnt import packSFNT, getSFNTCollectionData, getWOFFCo
 from testCaseGeneratorLib.paths import resourcesDirectory, decoderDirectory, decoderTestDirectory,\
                                        decoderResourcesDirectory, sfntTTFSourcePath
 from testCaseGeneratorLib.woff import packTestDirectory, packTestHeader
-from testCaseGeneratorLib.html import generateDecoderIndexHTML, expandSpecLinks
+from testCaseGeneratorLib.html import generateDecoderIndexHTML, expandSpecLinks, writeLines
 from testCaseGeneratorLib.utilities import padData, calcPaddingLength, calcTableChecksum
 from testCaseGeneratorLib import sharedCases
 from testCaseGeneratorLib.sharedCases import *
@@ -525,9 +525,7 @@ for tag, title, url, note in groupDefinitions:
 path = os.path.join(decoderDirectory, "manifest.txt")
 if os.path.exists(path):
     os.remove(path)
-f = open(path, "w")
-f.write("\n".join(manifest))
-f.close()
+writeLines(path, manifest)
 
 # -----------------------
 # Check for Unknown Files
@@ -25,9 +25,11 @@ import struct
 import zipfile
 from fontTools.misc import sstruct
 from testCaseGeneratorLib.woff import packTestHeader, packTestDirectory, packTestMetadata, packTestPrivateData
-from testCaseGeneratorLib.defaultData import defaultTestData, testDataWOFFMetadata, testDataWOFFPrivateData
+from testCaseGeneratorLib.defaultData import defaultTestData, testDataWOFFMetadata, testDataWOFFPrivateData, sfntTTFTransformedData,\
+    sfntTTFTransformedOffsets
 from testCaseGeneratorLib.paths import resourcesDirectory, formatDirectory, formatTestDirectory, formatResourcesDirectory
-from testCaseGeneratorLib.html import generateFormatIndexHTML, expandSpecLinks
+from testCaseGeneratorLib.html import generateFormatIndexHTML, expandSpecLinks, writeLines
+from testCaseGeneratorLib.utilities import brotliQuality
 from testCaseGeneratorLib import sharedCases
 from testCaseGeneratorLib.sharedCases import *
 
@@ -832,22 +834,22 @@ def makeMismatchedLocaGlyfTransform(tag):
     tableData, compressedData, tableOrder, tableChecksums = getSFNTData(sfntTTFSourcePath)
     tagData = tableData[tag]
     header, directory, tableData = defaultTestData(flavor="ttf")
-    decompressedTableData = brotli.decompress(tableData)
-    offset = 0
+    decompressedTableData = bytearray(sfntTTFTransformedData)
+    offset = sfntTTFTransformedOffsets[tag]
     for entry in directory:
         if entry["tag"] == tag:
-            decompressedTableData = decompressedTableData[:offset] + tagData[0] + decompressedTableData[offset:]
+            decompressedTableData[offset:offset] = tagData[0]
             entry["transformLength"] = entry["origLength"]
             entry["transformFlag"] = 3
-        offset += entry["transformLength"]
 
-    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT)
+    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT, brotliQuality)
 
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
     header["totalCompressedSize"] = len(tableData)
 
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 writeTest(
@@ -2871,9 +2873,7 @@ for tag, title, url in groupDefinitions:
 path = os.path.join(formatDirectory, "manifest.txt")
 if os.path.exists(path):
     os.remove(path)
-f = open(path, "w")
-f.write("\n".join(manifest))
-f.close()
+writeLines(path, manifest)
 
 # -----------------------
 # Check for Unknown Files
@@ -35,7 +35,7 @@ from fontTools.pens.ttGlyphPen import TTGlyphPen
 from fontTools.ttLib import TTFont, getTableModule
 from testCaseGeneratorLib.woff import packTestHeader, packTestDirectory, packTestMetadata, packTestPrivateData, base128Size, transformedTables, woffHeaderSize
 from testCaseGeneratorLib.defaultData import defaultTestData, testDataWOFFMetadata, testDataWOFFPrivateData
-from testCaseGeneratorLib.html import generateSFNTDisplayTestHTML, generateSFNTDisplayRefHTML, generateSFNTDisplayIndexHTML, expandSpecLinks, doNotEditWarning
+from testCaseGeneratorLib.html import generateSFNTDisplayTestHTML, generateSFNTDisplayRefHTML, generateSFNTDisplayIndexHTML, flushTestPages, expandSpecLinks, doNotEditWarning, writeLines
 from testCaseGeneratorLib.paths import resourcesDirectory, userAgentDirectory, userAgentTestDirectory, userAgentTestResourcesDirectory, sfntTTFCompositeSourcePath
 from testCaseGeneratorLib import sharedCases
 from testCaseGeneratorLib.sfnt import getSFNTData, getWOFFCollectionData, getTTFont
@@ -1083,9 +1083,10 @@ def makeBase128Bug2():
     for entry in directory:
         if entry["tag"] in transformedTables:
             entry["origLength"] = 2**32
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 # UIntBase128 exceeds 2^{32}-1
@@ -1127,9 +1128,10 @@ def makeBase128Bug3():
         if entry["tag"] in transformedTables:
             entry["origLength"] = 2**35
             assert base128Size(entry["origLength"]) > 5
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 # UIntBase128 longer than 5 bytes
@@ -3306,6 +3308,12 @@ registeredIdentifiers.add(identifier2)
 registeredTitles.add(title2)
 registeredAssertions.add(assertion2)
 
+# ----------------------
+# Write the Queued Pages
+# ----------------------
+
+flushTestPages()
+
 # ------------------
 # Generate the Index
 # ------------------
@@ -3366,9 +3374,7 @@ for tag, title, url in groupDefinitions:
 path = os.path.join(userAgentDirectory, "manifest.txt")
 if os.path.exists(path):
     os.remove(path)
-f = open(path, "w")
-f.write("\n".join(manifest))
-f.close()
+writeLines(path, manifest)
 
 # -----------------------
 # Check for Unknown Files
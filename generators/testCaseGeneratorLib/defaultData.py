@@ -30,6 +30,18 @@ for tag, checksum in sfntCFFTableChecksums.items():
         assert originalSFNTChecksums[data] == checksum
     originalSFNTChecksums[data] = checksum
 
+# the uncompressed table data streams, for test cases that
+# modify the data before compressing it
+sfntTTFTransformedData = b"".join([sfntTTFTableData[tag][1] for tag in sfntTTFTableOrder])
+sfntCFFTransformedData = b"".join([sfntCFFTableData[tag][1] for tag in sfntCFFTableOrder])
+
+# offsets of the tables in the TTF stream
+sfntTTFTransformedOffsets = {}
+offset = 0
+for tag in sfntTTFTableOrder:
+    sfntTTFTransformedOffsets[tag] = offset
+    offset += len(sfntTTFTableData[tag][1])
+
 # --------
 # Metadata
 # --------
@@ -223,7 +235,34 @@ for tag in sfntCFFTableOrder:
 # Default Data Creator
 # --------------------
 
+# parts built from the default header, directory and table data,
+# keyed by the remaining arguments. most test cases start from the
+# defaults, so the lengths and the compressed metadata are only
+# calculated once for each combination. test specific metadata and
+# private data are almost never reused, so only the shared fixtures
+# below are cached.
+_defaultTestDataCache = {}
+
+def _isSharedTestData(data, fixture):
+    return data is None or data is fixture
+
+def _copyTestData(parts):
+    """
+    Copy cached default parts. The header and the directory
+    entries are flat dicts and the rest of the parts are
+    immutable, so only those dicts are copied.
+    """
+    header, directory = parts[:2]
+    return [dict(header), [dict(entry) for entry in directory]] + parts[2:]
+
 def defaultTestData(header=None, directory=None, collectionHeader=None, collectionDirectory=None, tableData=None, compressedData=None, metadata=None, privateData=None, flavor="cff", Base128Bug=False, knownTags=knownTableTags, skipTransformLength=False):
+    cacheKey = None
+    if header is None and directory is None and collectionDirectory is None and tableData is None and compressedData is None \
+        and _isSharedTestData(metadata, testDataWOFFMetadata) and _isSharedTestData(privateData, testDataWOFFPrivateData):
+        cacheKey = (flavor == "cff", metadata, privateData, Base128Bug, tuple(knownTags), skipTransformLength)
+        if cacheKey in _defaultTestDataCache:
+            # the callers modify the header and the directory
+            return _copyTestData(_defaultTestDataCache[cacheKey])
     isCollection = collectionDirectory is not None
     parts = []
     # setup the header
@@ -315,6 +354,8 @@ def defaultTestData(header=None, directory=None, collectionHeader=None, collecti
         header["privLength"] = len(privateData)
         header["length"] += len(privateData)
         parts.append(privateData)
+    if cacheKey is not None:
+        _defaultTestDataCache[cacheKey] = _copyTestData(parts)
     # return the parts
     return parts
 
@@ -3,7 +3,11 @@ Test case HTML generator.
 """
 
 import os
+import io
+import re
 import html
+import functools
+import concurrent.futures
 
 from testCaseGeneratorLib.paths import userAgentTestResourcesDirectory
 
@@ -63,14 +67,102 @@ pre {
 }
 """.strip()
 
-def escapeAttributeText(text):
-    text = html.escape(text)
-    replacements = {
-        "\"" : "&quot;",
-    }
-    for before, after in replacements.items():
-        text = text.replace(before, after)
-    return text
+# The start of the head and the reviewer are
+# the same in every test and reference page.
+
+sfntDisplayTestHead = """
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+%s
+<html xmlns="http://www.w3.org/1999/xhtml">
+	<head>
+		<meta http-equiv="content-type" content="text/html;charset=UTF-8"/>
+""".lstrip("\n") % doNotEditWarning
+
+sfntDisplayTestReviewer = """
+		<link rel="reviewer" title="Chris Lilley" href="mailto:chris@w3.org" />
+""".lstrip("\n")
+
+# The test CSS only varies by file name once the flavor is known,
+# so it is formatted once per flavor and split around the file name.
+# The reference CSS only depends on the flavor, so getRefCSS is memoized.
+
+userAgentTestResourcesDirectoryName = os.path.basename(userAgentTestResourcesDirectory)
+
+_testCSSParts = {}
+
+def getTestCSS(fileName, flavor):
+    parts = _testCSSParts.get(flavor)
+    if parts is None:
+        parts = (testCSS % (userAgentTestResourcesDirectoryName, "\0", flavor)).split("\0")
+        _testCSSParts[flavor] = parts
+    prefix, suffix = parts
+    return prefix + fileName + suffix
+
+@functools.lru_cache(maxsize=None)
+def getRefCSS(flavor):
+    return refCSS % flavor
+
+# html.escape already turns " into &quot; since quote defaults to True.
+escapeAttributeText = html.escape
+
+def _indentLines(text, indent):
+    """
+    Prefix every line in text with indent.
+    """
+    return "\n".join([indent + line for line in text.splitlines()])
+
+# The test and reference pages are small and there are a lot
+# of them, so they are queued and written together by a pool
+# of threads when flushTestPages is called.
+
+_pendingTestPages = []
+
+def _queueTestPage(path, text):
+    _pendingTestPages.append((path, text.encode("utf-8")))
+
+def _writePageData(item):
+    # the page is already encoded, so hand it straight to the
+    # kernel instead of going through a buffered file object.
+    path, data = item
+    # leave pages that are already up to date alone.
+    try:
+        if os.stat(path).st_size == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return
+    except OSError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        data = memoryview(data)
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+def flushTestPages():
+    """
+    Write all queued test and reference pages.
+    This must be called before the pages are needed on disk.
+    """
+    if not _pendingTestPages:
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        # list() so that any write error is raised here
+        list(executor.map(_writePageData, _pendingTestPages))
+    del _pendingTestPages[:]
+
+def writeLines(path, lines):
+    """
+    Write the lines to path separated by newlines. The lines
+    are streamed to the file instead of being joined first,
+    through a 64 KiB buffer so that the index pages only take
+    a handful of writes.
+    """
+    lines = iter(lines)
+    with open(path, "w", buffering=1 << 16) as f:
+        f.write(next(lines, ""))
+        f.writelines("\n" + line for line in lines)
 
 def _generateSFNTDisplayTestHTML(
     css, bodyCharacter,
@@ -87,94 +179,73 @@ def _generateSFNTDisplayTestHTML(
     assert title is not None
     assert specLinks
     assert assertion is not None
-    html_string = [
-        "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.0 Strict//EN\" \"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd\">",
-        doNotEditWarning,
-        "<html xmlns=\"http://www.w3.org/1999/xhtml\">"
-    ]
-    # head
-    html_string.append("\t<head>")
-    ## encoding
-    s = "\t\t<meta http-equiv=\"content-type\" content=\"text/html;charset=UTF-8\"/>"
-    html_string.append(s)
+    html_string = io.StringIO()
+    write = html_string.write
+    # doctype, head and encoding
+    write(sfntDisplayTestHead)
     ## title
-    s = "\t\t<title>WOFF Test: %s</title>" % html.escape(title)
-    html_string.append(s)
+    write("\t\t<title>WOFF Test: %s</title>\n" % html.escape(title))
     ## author
     for credit in credits:
         role = credit.get("role")
-        title = credit.get("title")
+        creditTitle = credit.get("title")
         link = credit.get("link")
         date = credit.get("date")
-        s = "\t\t<link rel=\"%s\" title=\"%s\" href=\"%s\" />" % (role, title, link)
+        s = "\t\t<link rel=\"%s\" title=\"%s\" href=\"%s\" />" % (role, creditTitle, link)
         if date:
             s += " <!-- %s -->" % date
-        html_string.append(s)
+        write(s + "\n")
     ## link
     assert chapterURL is not None
-    s = "\t\t<link rel=\"help\" href=\"%s\" />" % chapterURL
-    html_string.append(s)
+    write("\t\t<link rel=\"help\" href=\"%s\" />\n" % chapterURL)
     for link in specLinks:
-        s = "\t\t<link rel=\"help\" href=\"%s\" />" % link
-        html_string.append(s)
+        write("\t\t<link rel=\"help\" href=\"%s\" />\n" % link)
     ## reviewer
-    s = '\t\t<link rel="reviewer" title="Chris Lilley" href="mailto:chris@w3.org" />'
-    html_string.append(s)
+    write(sfntDisplayTestReviewer)
     # matching reference
     if refFileName:
-        s = '\t\t<link rel="match" href="%s" />' % refFileName
-        html_string.append(s)
+        write('\t\t<link rel="match" href="%s" />\n' % refFileName)
     ## flags
     if flags:
-        s = "\t\t<meta name=\"flags\" content=\"%s\" />" % " ".join(flags)
-        html_string.append(s)
+        write("\t\t<meta name=\"flags\" content=\"%s\" />\n" % " ".join(flags))
     ## assertion
-    s = "\t\t<meta name=\"assert\" content=\"%s\" />" % escapeAttributeText(assertion)
-    html_string.append(s)
+    write("\t\t<meta name=\"assert\" content=\"%s\" />\n" % escapeAttributeText(assertion))
     ## css
-    html_string.append("\t\t<style type=\"text/css\"><![CDATA[")
-    s = "\n".join(["\t\t\t" + line for line in css.splitlines()])
-    html_string.append(s)
-    html_string.append("\t\t]]></style>")
+    write("\t\t<style type=\"text/css\"><![CDATA[\n")
+    write(_indentLines(css, "\t\t\t") + "\n")
+    write("\t\t]]></style>\n")
     ## close
-    html_string.append("\t</head>")
+    write("\t</head>\n")
     # body
-    html_string.append("\t<body>")
+    write("\t<body>\n")
     ## note
     if metadataIsValid is None:
-        s = "\t\t<p>Test passes if the word PASS appears below.</p>"
+        write("\t\t<p>Test passes if the word PASS appears below.</p>\n")
+    elif not metadataIsValid:
+        write("\t\t<p>If the UA does not display WOFF metadata, the test passes if the word PASS appears below.</p>\n")
+        write("\t\t<p>The Extended Metadata Block is not valid and must not be displayed. If the UA does display it, the test fails.</p>\n")
     else:
-        if not metadataIsValid:
-            s = "\t\t<p>If the UA does not display WOFF metadata, the test passes if the word PASS appears below.</p>\n"
-            s += "\t\t<p>The Extended Metadata Block is not valid and must not be displayed. If the UA does display it, the test fails.</p>"
-        else:
-            s = "\t\t<p>Test passes if the word PASS appears below.</p>\n"
-            s += "\t\t<p>The Extended Metadata Block is valid and may be displayed to the user upon request.</p>"
-    html_string.append(s)
+        write("\t\t<p>Test passes if the word PASS appears below.</p>\n")
+        write("\t\t<p>The Extended Metadata Block is valid and may be displayed to the user upon request.</p>\n")
     # extra notes
     for note in extraSFNTNotes:
-        s = "\t\t<p>%s</p>" % html.escape(note)
-        html_string.append(s)
+        write("\t\t<p>%s</p>\n" % html.escape(note))
     for note in extraMetadataNotes:
-        s = "\t\t<p>%s</p>" % html.escape(note)
-        html_string.append(s)
+        write("\t\t<p>%s</p>\n" % html.escape(note))
     ## test case
-    s = "\t\t<div class=\"test\">%s</div>" % bodyCharacter
-    html_string.append(s)
+    write("\t\t<div class=\"test\">%s</div>\n" % bodyCharacter)
     ## show metadata
     if metadataToDisplay:
-        s = "\t\t<p>The XML contained in the Extended Metadata Block is below.</p>"
-        html_string.append(s)
-        html_string.append("\t\t<pre>")
-        html_string.append(html.escape(metadataToDisplay))
-        html_string.append("\t\t</pre>")
+        write("\t\t<p>The XML contained in the Extended Metadata Block is below.</p>\n")
+        write("\t\t<pre>\n")
+        write(html.escape(metadataToDisplay) + "\n")
+        write("\t\t</pre>\n")
     ## close
-    html_string.append("\t</body>")
+    write("\t</body>\n")
     # close
-    html_string.append("</html>")
+    write("</html>")
     # finalize
-    html_string = "\n".join(html_string)
-    return html_string
+    return html_string.getvalue()
 
 def generateSFNTDisplayTestHTML(
     fileName=None, directory=None, flavor=None, title=None,
@@ -187,8 +258,7 @@ def generateSFNTDisplayTestHTML(
     bodyCharacter = testFailCharacter
     if shouldDisplay:
         bodyCharacter = testPassCharacter
-    dirName = os.path.basename(userAgentTestResourcesDirectory)
-    css = testCSS % (dirName, fileName, flavor)
+    css = getTestCSS(fileName, flavor)
     specLinks = []
     if sfntDisplaySpecLink:
         specLinks += sfntDisplaySpecLink
@@ -210,10 +280,8 @@ def generateSFNTDisplayTestHTML(
         chapterURL=chapterURL
     )
     # write the file
-    path = os.path.join(directory, fileName) + ".xht"
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+    path = os.path.join(directory, fileName + ".xht")
+    _queueTestPage(path, html_string)
 
 def generateSFNTDisplayRefHTML(
         fileName=None, directory=None, flavor=None, title=None,
@@ -224,7 +292,7 @@ def generateSFNTDisplayRefHTML(
         chapterURL=None
     ):
     bodyCharacter = refPassCharacter
-    css = refCSS % flavor
+    css = getRefCSS(flavor)
     specLinks = []
     if sfntDisplaySpecLink:
         specLinks += sfntDisplaySpecLink
@@ -244,400 +312,271 @@ def generateSFNTDisplayRefHTML(
         chapterURL=chapterURL
     )
     # write the file
-    path = os.path.join(directory, fileName) + "-ref.xht"
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+    path = os.path.join(directory, fileName + "-ref.xht")
+    _queueTestPage(path, html_string)
+
+poorManMathPattern = re.compile(r"\^\{(.*.)\}")
 
 def poorManMath(text):
-    import re
-    return re.sub(r"\^\{(.*.)\}", r"<sup>\1</sup>", text)
+    # most strings have no superscript, skip the regex for those.
+    if text.find("^{") == -1:
+        return text
+    return poorManMathPattern.sub(r"<sup>\1</sup>", text)
+
+# ---------------
+# Index Templates
+# ---------------
+
+indexHeadTemplate = """
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.1//EN" "http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd">
+%(doNotEditWarning)s
+<html xmlns="http://www.w3.org/1999/xhtml">
+	<head>
+		<title>WOFF 2.0: %(suiteTitle)s Test Suite</title>
+		<style type="text/css">
+			@import "%(resourcesDirectoryName)s/index.css";
+		</style>
+	</head>
+	<body>
+		<h1>WOFF 2.0: %(suiteTitle)s Test Suite (%(testCount)d tests)</h1>
+""".strip("\n")
+
+# the warning is the same on every index page, fill it in once.
+indexHeadTemplate = indexHeadTemplate.replace("%(doNotEditWarning)s", doNotEditWarning)
+
+indexDownloadNoteTemplate = """
+		<div class="mainNote">
+			The files used in these test can be obtained individually <a href="../xhtml1">here</a> or as a single zip file <a href="%s">here</a>.
+		</div>
+""".strip("\n")
+
+indexFoot = """
+	</body>
+</html>
+""".strip("\n")
+
+sfntDisplayIndexTestCaseTemplate = """
+		<div class="testCase" id="%(identifier)s">
+			<div class="testCaseOverview">
+				<h3><a href="#%(identifier)s">%(identifier)s</a>: %(title)s</h3>
+				<p>%(assertion)s</p>
+			</div>
+			<div class="testCaseDetails">
+				<div class="testCasePages">
+					<p><a href="%(identifier)s.xht">Test</a></p>
+%(referencePage)s				</div>
+				<div class="testCaseExpectations">
+					<p>%(sfntExpectation)s</p>
+					<p>%(metadataExpectation)s</p>
+				</div>
+			</div>
+		</div>
+""".strip("\n")
+
+testCaseIndexTestCaseTemplate = """
+		<div class="testCase" id="%(identifier)s">
+			<div class="testCaseOverview">
+				<h3><a href="#%(identifier)s">%(identifier)s</a>: %(title)s</h3>
+				<p>%(description)s</p>
+			</div>
+			<div class="testCaseDetails">
+					<p>%(details)s</p>
+%(specLinks)s			</div>
+		</div>
+""".strip("\n")
+
+def _sfntExpectationText(sfntExpectation, sfntURL):
+    """
+    Render the SFNT expectation line of a user agent index entry.
+    """
+    if sfntExpectation:
+        sfntExpectation = "Display"
+    else:
+        sfntExpectation = "Reject"
+    if not sfntURL:
+        return "SFNT Expectation: %s" % sfntExpectation
+    links = " ".join([
+        "<a href=\"%s\">%s</a>" % (url, url.split("#")[-1] if "#" in url else "documentation")
+        for url in sfntURL
+    ])
+    return "SFNT Expectation: %s (%s)" % (sfntExpectation, links)
+
+def _metadataExpectationText(metadataExpectation, metadataURL):
+    """
+    Render the metadata expectation line of a user agent index entry.
+    """
+    if metadataExpectation is None:
+        metadataExpectation = "None"
+    elif metadataExpectation:
+        metadataExpectation = "Display"
+    else:
+        metadataExpectation = "Reject"
+    if not metadataURL:
+        return "Metadata Expectation: %s" % metadataExpectation
+    if "#" in metadataURL:
+        s = "(%s)" % metadataURL.split("#")[-1]
+    else:
+        s = "(documentation)"
+    return "Metadata Expectation: %s <a href=\"%s\">%s</a>" % (metadataExpectation, metadataURL, s)
 
 def generateSFNTDisplayIndexHTML(directory=None, testCases=[]):
     testCount = sum([len(group["testCases"]) for group in testCases])
     html_string = [
-        "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.1//EN\" \"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd\">",
-        doNotEditWarning,
-        "<html xmlns=\"http://www.w3.org/1999/xhtml\">",
-        "\t<head>",
-        "\t\t<title>WOFF 2.0: User Agent Test Suite</title>",
-        "\t\t<style type=\"text/css\">",
-        "\t\t\t@import \"%s/index.css\";" % os.path.basename(userAgentTestResourcesDirectory),
-        "\t\t</style>",
-        "\t</head>",
-        "\t<body>",
-        "\t\t<h1>WOFF 2.0: User Agent Test Suite (%d tests)</h1>" % testCount
+        indexHeadTemplate % dict(
+            suiteTitle="User Agent",
+            resourcesDirectoryName=userAgentTestResourcesDirectoryName,
+            testCount=testCount
+        )
     ]
+    # local names for the calls made in the loops
+    append = html_string.append
+    escape = html.escape
     # add the test groups
     for group in testCases:
-        title = group["title"]
-        title = html.escape(title)
+        groupTitle = escape(group["title"])
         # write the group header
-        html_string.append("")
-        html_string.append("\t\t<h2 class=\"testCategory\">%s</h2>" % title)
+        append("")
+        append("\t\t<h2 class=\"testCategory\">%s</h2>" % groupTitle)
         # write the individual test cases
         for test in group["testCases"]:
             identifier = test["identifier"]
-            title = test["title"]
-            title = html.escape(title)
-            title = poorManMath(title)
+            testTitle = poorManMath(escape(test["title"]))
             assertion = test["assertion"]
-            assertion = html.escape(assertion)
+            assertion = escape(assertion)
             assertion = poorManMath(assertion)
-            sfntExpectation = test["sfntExpectation"]
-            if sfntExpectation:
-                sfntExpectation = "Display"
-            else:
-                sfntExpectation = "Reject"
-            sfntURL = test["sfntURL"]
-            metadataExpectation = test["metadataExpectation"]
-            if metadataExpectation is None:
-                metadataExpectation = "None"
-            elif metadataExpectation:
-                metadataExpectation = "Display"
-            else:
-                metadataExpectation = "Reject"
-            metadataURL = test["metadataURL"]
-            # start the test case div
-            html_string.append("\t\t<div class=\"testCase\" id=\"%s\">" % identifier)
-            # start the overview div
-            html_string.append("\t\t\t<div class=\"testCaseOverview\">")
-            # title
-            html_string.append("\t\t\t\t<h3><a href=\"#%s\">%s</a>: %s</h3>" % (identifier, identifier, title))
-            # assertion
-            html_string.append("\t\t\t\t<p>%s</p>" % assertion)
-            # close the overview div
-            html_string.append("\t\t\t</div>")
-            # start the details div
-            html_string.append("\t\t\t<div class=\"testCaseDetails\">")
-            # start the pages div
-            html_string.append("\t\t\t\t<div class=\"testCasePages\">")
-            # test page
-            html_string.append("\t\t\t\t\t<p><a href=\"%s.xht\">Test</a></p>" % identifier)
             # reference page
+            referencePage = ""
             if test["hasReferenceRendering"]:
-                html_string.append("\t\t\t\t\t<p><a href=\"%s-ref.xht\">Reference Rendering</a></p>" % identifier)
-            # close the pages div
-            html_string.append("\t\t\t\t</div>")
-            # start the expectations div
-            html_string.append("\t\t\t\t<div class=\"testCaseExpectations\">")
-            # sfnt expectation
-            string = "SFNT Expectation: %s" % sfntExpectation
-            if sfntURL:
-                links = []
-                for url in sfntURL:
-                    if "#" in url:
-                        url = "<a href=\"%s\">%s</a>" % (url, url.split("#")[-1])
-                        links.append(url)
-                    else:
-                        url = "<a href=\"%s\">documentation</a>" % url
-                        links.append(url)
-                string += " (%s)" % " ".join(links)
-            html_string.append("\t\t\t\t\t<p>%s</p>" % string)
-            # metadata expectation
-            string = "Metadata Expectation: %s" % metadataExpectation
-            if metadataURL:
-                if "#" in metadataURL:
-                    s = "(%s)" % metadataURL.split("#")[-1]
-                else:
-                    s = "(documentation)"
-                string += " <a href=\"%s\">%s</a>" % (metadataURL, s)
-            html_string.append("\t\t\t\t\t<p>%s</p>" % string)
-            # close the expectations div
-            html_string.append("\t\t\t\t</div>")
-            # close the details div
-            html_string.append("\t\t\t</div>")
-            # close the test case div
-            html_string.append("\t\t</div>")
-
-    # close body
-    html_string.append("\t</body>")
-    # close html
-    html_string.append("</html>")
-    # finalize
-    html_string = "\n".join(html_string)
+                referencePage = "\t\t\t\t\t<p><a href=\"%s-ref.xht\">Reference Rendering</a></p>\n" % identifier
+            # expectations
+            sfntExpectation = _sfntExpectationText(test["sfntExpectation"], test["sfntURL"])
+            metadataExpectation = _metadataExpectationText(test["metadataExpectation"], test["metadataURL"])
+            # the test case div
+            append(sfntDisplayIndexTestCaseTemplate % dict(
+                identifier=identifier,
+                title=testTitle,
+                assertion=assertion,
+                referencePage=referencePage,
+                sfntExpectation=sfntExpectation,
+                metadataExpectation=metadataExpectation
+            ))
+
+    # close body and html
+    append(indexFoot)
     # write
     path = os.path.join(directory, "testcaseindex.xht")
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+    writeLines(path, html_string)
 
-def generateFormatIndexHTML(directory=None, testCases=[]):
-    testCount = sum([len(group["testCases"]) for group in testCases])
-    html_string = [
-        "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.1//EN\" \"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd\">",
-        doNotEditWarning,
-        "<html xmlns=\"http://www.w3.org/1999/xhtml\">",
-        "\t<head>",
-        "\t\t<title>WOFF 2.0: Format Test Suite</title>",
-        "\t\t<style type=\"text/css\">",
-        "\t\t\t@import \"resources/index.css\";",
-        "\t\t</style>",
-        "\t</head>",
-        "\t<body>",
-        "\t\t<h1>WOFF 2.0: Format Test Suite (%d tests)</h1>" % testCount,
-    ]
-    # add a download note
-    html_string.append("\t\t<div class=\"mainNote\">")
-    html_string.append("\t\t\tThe files used in these test can be obtained individually <a href=\"../xhtml1\">here</a> or as a single zip file <a href=\"FormatTestFonts.zip\">here</a>.")
-    html_string.append("\t\t</div>")
-    # add the test groups
-    for group in testCases:
-        title = group["title"]
-        title = html.escape(title)
-        # write the group header
-        html_string.append("")
-        html_string.append("\t\t<h2 class=\"testCategory\">%s</h2>" % title)
-        # write the individual test cases
-        for test in group["testCases"]:
-            identifier = test["identifier"]
-            title = test["title"]
-            title = html.escape(title)
-            description = test["description"]
-            description = html.escape(description)
-            valid = test["valid"]
-            if valid:
-                valid = "Yes"
-            else:
-                valid = "No"
-            specLink = test["specLink"]
-            # start the test case div
-            html_string.append("\t\t<div class=\"testCase\" id=\"%s\">" % identifier)
-            # start the overview div
-            html_string.append("\t\t\t<div class=\"testCaseOverview\">")
-            # title
-            html_string.append("\t\t\t\t<h3><a href=\"#%s\">%s</a>: %s</h3>" % (identifier, identifier, title))
-            # assertion
-            html_string.append("\t\t\t\t<p>%s</p>" % description)
-            # close the overview div
-            html_string.append("\t\t\t</div>")
-            # start the details div
-            html_string.append("\t\t\t<div class=\"testCaseDetails\">")
-            # validity
-            string = "Valid: <span id=\"%s-validity\">%s</span>" % (identifier, valid)
-            html_string.append("\t\t\t\t\t<p>%s</p>" % string)
-            # documentation
-            if specLink is not None:
-                links = specLink.split(' ')
-
-                html_string.append("\t\t\t\t\t<p>")
-                for link in links:
-                    name = 'Documentation'
-                    if '#' in link:
-                        name = link.split('#')[1]
-                    string = "\t\t\t\t\t\t<a href=\"%s\">%s</a> " % (link, name)
-                    html_string.append(string)
-                html_string.append("\t\t\t\t\t</p>")
-
-            # close the details div
-            html_string.append("\t\t\t</div>")
-            # close the test case div
-            html_string.append("\t\t</div>")
-    # close body
-    html_string.append("\t</body>")
-    # close html
-    html_string.append("</html>")
-    # finalize
-    html_string = "\n".join(html_string)
-    # write
-    path = os.path.join(directory, "testcaseindex.xht")
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+@functools.lru_cache(maxsize=256)
+def _renderSpecLinks(specLink):
+    """
+    Render the documentation paragraph for a space separated
+    list of spec links. The display name of each link is
+    its anchor, if it has one. Many tests share the same
+    links, so the rendered paragraphs are cached.
+    """
+    links = "\n".join([
+        "\t\t\t\t\t\t<a href=\"%s\">%s</a> " % (link, link.split("#", 1)[1] if "#" in link else "Documentation")
+        for link in specLink.split(" ")
+    ])
+    return "\t\t\t\t\t<p>\n%s\n\t\t\t\t\t</p>\n" % links
 
-def generateAuthoringToolIndexHTML(directory=None, testCases=[], note=None):
+def _generateTestCaseIndexHTML(directory, testCases, suiteTitle, zipFileName, detailKey, detailTemplate, note=None):
+    """
+    Write the index for a suite of test cases that are listed
+    with a description, a yes/no detail and spec links. This
+    is shared by the format, authoring tool and decoder suites.
+    """
     testCount = sum([len(group["testCases"]) for group in testCases])
     html_string = [
-        "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.1//EN\" \"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd\">",
-        doNotEditWarning,
-        "<html xmlns=\"http://www.w3.org/1999/xhtml\">",
-        "\t<head>",
-        "\t\t<title>WOFF 2.0: Authoring Tool Test Suite</title>",
-        "\t\t<style type=\"text/css\">",
-        "\t\t\t@import \"resources/index.css\";",
-        "\t\t</style>",
-        "\t</head>",
-        "\t<body>",
-        "\t\t<h1>WOFF 2.0: Authoring Tool Test Suite (%d tests)</h1>" % testCount,
+        indexHeadTemplate % dict(
+            suiteTitle=suiteTitle,
+            resourcesDirectoryName="resources",
+            testCount=testCount
+        )
     ]
+    # local names for the calls made in the loops
+    append = html_string.append
+    escape = html.escape
     # add a download note
-    html_string.append("\t\t<div class=\"mainNote\">")
-    html_string.append("\t\t\tThe files used in these test can be obtained individually <a href=\"../xhtml1\">here</a> or as a single zip file <a href=\"AuthoringToolTestFonts.zip\">here</a>.")
-    html_string.append("\t\t</div>")
+    append(indexDownloadNoteTemplate % zipFileName)
     # add the note
     if note:
-        html_string.append("\t\t<div class=\"mainNote\">")
-        for line in note.splitlines():
-            html_string.append("\t\t\t" + line)
-        html_string.append("\t\t</div>")
+        append("\t\t<div class=\"mainNote\">")
+        append(_indentLines(note, "\t\t\t"))
+        append("\t\t</div>")
     # add the test groups
     for group in testCases:
-        title = group["title"]
-        title = html.escape(title)
+        groupTitle = escape(group["title"])
         # write the group header
-        html_string.append("")
-        html_string.append("\t\t<h2 class=\"testCategory\">%s</h2>" % title)
+        append("")
+        append("\t\t<h2 class=\"testCategory\">%s</h2>" % groupTitle)
         # write the group note
-        note = group["note"]
-        if note:
-            html_string.append("\t\t<div class=\"testCategoryNote\">")
-            for line in note.splitlines():
-                html_string.append("\t\t\t" + line)
-            html_string.append("\t\t</div>")
+        groupNote = group.get("note")
+        if groupNote:
+            append("\t\t<div class=\"testCategoryNote\">")
+            append(_indentLines(groupNote, "\t\t\t"))
+            append("\t\t</div>")
         # write the individual test cases
         for test in group["testCases"]:
             identifier = test["identifier"]
-            title = test["title"]
-            title = html.escape(title)
+            testTitle = escape(test["title"])
             description = test["description"]
-            description = html.escape(description)
-            shouldConvert = test["shouldConvert"]
-            if shouldConvert:
-                shouldConvert = "Yes"
+            description = escape(description)
+            detail = test[detailKey]
+            if detail:
+                detail = "Yes"
             else:
-                shouldConvert = "No"
+                detail = "No"
             specLink = test["specLink"]
-            # start the test case div
-            html_string.append("\t\t<div class=\"testCase\" id=\"%s\">" % identifier)
-            # start the overview div
-            html_string.append("\t\t\t<div class=\"testCaseOverview\">")
-            # title
-            html_string.append("\t\t\t\t<h3><a href=\"#%s\">%s</a>: %s</h3>" % (identifier, identifier, title))
-            # assertion
-            html_string.append("\t\t\t\t<p>%s</p>" % description)
-            # close the overview div
-            html_string.append("\t\t\t</div>")
-            # start the details div
-            html_string.append("\t\t\t<div class=\"testCaseDetails\">")
             # validity
-            string = "Should Convert to WOFF: <span id=\"%s-shouldconvert\">%s</span>" % (identifier, shouldConvert)
-            html_string.append("\t\t\t\t\t<p>%s</p>" % string)
+            details = detailTemplate % (identifier, detail)
             # documentation
+            specLinks = ""
             if specLink is not None:
-                links = specLink.split(' ')
-
-                html_string.append("\t\t\t\t\t<p>")
-                for link in links:
-                    name = 'Documentation'
-                    if '#' in link:
-                        name = link.split('#')[1]
-                    string = "\t\t\t\t\t\t<a href=\"%s\">%s</a> " % (link, name)
-                    html_string.append(string)
-                html_string.append("\t\t\t\t\t</p>")
-
-            # close the details div
-            html_string.append("\t\t\t</div>")
-            # close the test case div
-            html_string.append("\t\t</div>")
-    # close body
-    html_string.append("\t</body>")
-    # close html
-    html_string.append("</html>")
-    # finalize
-    html_string = "\n".join(html_string)
+                specLinks = _renderSpecLinks(specLink)
+            # the test case div
+            append(testCaseIndexTestCaseTemplate % dict(
+                identifier=identifier,
+                title=testTitle,
+                description=description,
+                details=details,
+                specLinks=specLinks
+            ))
+    # close body and html
+    append(indexFoot)
     # write
     path = os.path.join(directory, "testcaseindex.xht")
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+    writeLines(path, html_string)
 
-def generateDecoderIndexHTML(directory=None, testCases=[], note=None):
-    testCount = sum([len(group["testCases"]) for group in testCases])
-    html_string = [
-        "<!DOCTYPE html PUBLIC \"-//W3C//DTD XHTML 1.1//EN\" \"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd\">",
-        doNotEditWarning,
-        "<html xmlns=\"http://www.w3.org/1999/xhtml\">",
-        "\t<head>",
-        "\t\t<title>WOFF 2.0: Decoder Test Suite</title>",
-        "\t\t<style type=\"text/css\">",
-        "\t\t\t@import \"resources/index.css\";",
-        "\t\t</style>",
-        "\t</head>",
-        "\t<body>",
-        "\t\t<h1>WOFF 2.0: Decoder Test Suite (%d tests)</h1>" % testCount,
-    ]
-    # add a download note
-    html_string.append("\t\t<div class=\"mainNote\">")
-    html_string.append("\t\t\tThe files used in these test can be obtained individually <a href=\"../xhtml1\">here</a> or as a single zip file <a href=\"AuthoringToolTestFonts.zip\">here</a>.")
-    html_string.append("\t\t</div>")
-    # add the note
-    if note:
-        html_string.append("\t\t<div class=\"mainNote\">")
-        for line in note.splitlines():
-            html_string.append("\t\t\t" + line)
-        html_string.append("\t\t</div>")
-    # add the test groups
-    for group in testCases:
-        title = group["title"]
-        title = html.escape(title)
-        # write the group header
-        html_string.append("")
-        html_string.append("\t\t<h2 class=\"testCategory\">%s</h2>" % title)
-        # write the group note
-        note = group["note"]
-        if note:
-            html_string.append("\t\t<div class=\"testCategoryNote\">")
-            for line in note.splitlines():
-                html_string.append("\t\t\t" + line)
-            html_string.append("\t\t</div>")
-        # write the individual test cases
-        for test in group["testCases"]:
-            identifier = test["identifier"]
-            title = test["title"]
-            title = html.escape(title)
-            description = test["description"]
-            description = html.escape(description)
-            roundTrip = test["roundTrip"]
-            if roundTrip:
-                roundTrip = "Yes"
-            else:
-                roundTrip = "No"
-            specLink = test["specLink"]
-            # start the test case div
-            html_string.append("\t\t<div class=\"testCase\" id=\"%s\">" % identifier)
-            # start the overview div
-            html_string.append("\t\t\t<div class=\"testCaseOverview\">")
-            # title
-            html_string.append("\t\t\t\t<h3><a href=\"#%s\">%s</a>: %s</h3>" % (identifier, identifier, title))
-            # assertion
-            html_string.append("\t\t\t\t<p>%s</p>" % description)
-            # close the overview div
-            html_string.append("\t\t\t</div>")
-            # start the details div
-            html_string.append("\t\t\t<div class=\"testCaseDetails\">")
-            # validity
-            string = "Round-Trip Test: <span id=\"%s-shouldconvert\">%s</span>" % (identifier, roundTrip)
-            html_string.append("\t\t\t\t\t<p>%s</p>" % string)
-            # documentation
-            if specLink is not None:
-                links = specLink.split(' ')
-
-                html_string.append("\t\t\t\t\t<p>")
-                for link in links:
-                    name = 'Documentation'
-                    if '#' in link:
-                        name = link.split('#')[1]
-                    string = "\t\t\t\t\t\t<a href=\"%s\">%s</a> " % (link, name)
-                    html_string.append(string)
-                html_string.append("\t\t\t\t\t</p>")
-
-            # close the details div
-            html_string.append("\t\t\t</div>")
-            # close the test case div
-            html_string.append("\t\t</div>")
-    # close body
-    html_string.append("\t</body>")
-    # close html
-    html_string.append("</html>")
-    # finalize
-    html_string = "\n".join(html_string)
-    # write
-    path = os.path.join(directory, "testcaseindex.xht")
-    f = open(path, "w")
-    f.write(html_string)
-    f.close()
+def generateFormatIndexHTML(directory=None, testCases=[]):
+    _generateTestCaseIndexHTML(
+        directory, testCases,
+        suiteTitle="Format",
+        zipFileName="FormatTestFonts.zip",
+        detailKey="valid",
+        detailTemplate="Valid: <span id=\"%s-validity\">%s</span>"
+    )
 
+def generateAuthoringToolIndexHTML(directory=None, testCases=[], note=None):
+    _generateTestCaseIndexHTML(
+        directory, testCases,
+        suiteTitle="Authoring Tool",
+        zipFileName="AuthoringToolTestFonts.zip",
+        detailKey="shouldConvert",
+        detailTemplate="Should Convert to WOFF: <span id=\"%s-shouldconvert\">%s</span>",
+        note=note
+    )
 
+def generateDecoderIndexHTML(directory=None, testCases=[], note=None):
+    _generateTestCaseIndexHTML(
+        directory, testCases,
+        suiteTitle="Decoder",
+        zipFileName="AuthoringToolTestFonts.zip",
+        detailKey="roundTrip",
+        detailTemplate="Round-Trip Test: <span id=\"%s-shouldconvert\">%s</span>",
+        note=note
+    )
 
 def expandSpecLinks(links):
     """
@@ -650,6 +589,12 @@ def expandSpecLinks(links):
     if links is None or len(links) == 0:
         links = ""
 
+    # a single link is by far the most common case
+    if " " not in links:
+        if links.startswith("woff1:"):
+            return woff1SpecificationURL + links[6:]
+        return specificationURL + links
+
     specLinks = []
     for link in links.split(" "):
         if link.startswith("woff1:"):
@@ -20,8 +20,7 @@ def dirname(path, depth=1):
         path = os.path.dirname(path)
     return path
 
-mainDirectory = dirname(__file__)
-mainDirectory = dirname(mainDirectory, 2)
+mainDirectory = dirname(__file__, 3)
 
 # directory for SFNT data, test case templates,
 resourcesDirectory = os.path.join(mainDirectory, "generators", "resources")
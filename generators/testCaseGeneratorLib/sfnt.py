@@ -2,15 +2,18 @@
 SFNT data extractor.
 """
 
+import os
 import brotli
 import struct
 from collections import OrderedDict
+from operator import itemgetter
 from fontTools.misc import sstruct
 from fontTools.ttLib import TTFont, getSearchRange
+from fontTools.misc.textTools import tobytes
 from fontTools.ttLib.sfnt import \
-    SFNTDirectoryEntry, sfntDirectoryFormat, sfntDirectorySize, sfntDirectoryEntryFormat, sfntDirectoryEntrySize, \
-    ttcHeaderFormat, ttcHeaderSize
-from testCaseGeneratorLib.utilities import padData, calcPaddingLength, calcHeadCheckSumAdjustmentSFNT, calcTableChecksum
+    sfntDirectorySize, sfntDirectoryEntrySize, ttcHeaderFormat, ttcHeaderSize
+from testCaseGeneratorLib.utilities import padData, calcPaddingLength, calcHeadCheckSumAdjustmentSFNT, calcTableChecksum, \
+    sfntDirectoryStruct, sfntDirectoryEntryStruct, brotliQuality
 from testCaseGeneratorLib.woff import packTestCollectionDirectory, packTestDirectory, packTestCollectionHeader, packTestHeader, transformTable
 
 def getTTFont(path, **kwargs):
@@ -20,6 +23,38 @@ def getTTFont(path, **kwargs):
 # Unpacking
 # ---------
 
+def _placeLocaNextToGlyf(tags, locaFirst=False):
+    """
+    Move loca directly after glyf, or directly
+    before it when locaFirst is True. loca is only
+    written back next to glyf, so glyf must be present.
+    """
+    assert "glyf" in tags
+    ordered = []
+    for tag in tags:
+        if tag == "glyf":
+            if locaFirst:
+                ordered.extend(("loca", "glyf"))
+            else:
+                ordered.extend(("glyf", "loca"))
+        elif tag != "loca":
+            ordered.append(tag)
+    return ordered
+
+def compressTableData(tables):
+    """
+    Compress the tables as one brotli stream. The tables are fed
+    to the compressor one at a time, so they are only joined when
+    compression does not help and the raw data is used instead.
+    """
+    compressor = brotli.Compressor(mode=brotli.MODE_FONT, quality=brotliQuality)
+    compData = [compressor.process(data) for data in tables]
+    compData.append(compressor.finish())
+    compData = b"".join(compData)
+    if len(compData) >= sum([len(data) for data in tables]):
+        compData = b"".join(tables)
+    return compData
+
 def getSFNTData(pathOrFile, unsortGlyfLoca=False, glyphBBox="", alt255UInt16=False):
     if isinstance(pathOrFile, TTFont):
         font = pathOrFile
@@ -29,24 +64,20 @@ def getSFNTData(pathOrFile, unsortGlyfLoca=False, glyphBBox="", alt255UInt16=Fal
     tableData = {}
     tableOrder = [i for i in sorted(font.keys()) if len(i) == 4]
     if unsortGlyfLoca:
-        assert "loca" in tableOrder
-        loca = tableOrder.index("loca")
-        glyf = tableOrder.index("glyf")
-        tableOrder.insert(glyf, tableOrder.pop(loca))
+        assert "glyf" in tableOrder and "loca" in tableOrder
+        tableOrder = _placeLocaNextToGlyf(tableOrder, locaFirst=True)
+    readerTables = font.reader.tables
     for tag in tableOrder:
-        tableChecksums[tag] = font.reader.tables[tag].checkSum
+        tableChecksums[tag] = readerTables[tag].checkSum
         tableData[tag] = transformTable(font, tag, glyphBBox=glyphBBox, alt255UInt16=alt255UInt16)
-    totalData = b"".join([tableData[tag][1] for tag in tableOrder])
-    compData = brotli.compress(totalData, brotli.MODE_FONT)
-    if len(compData) >= len(totalData):
-        compData = totalData
+    compData = compressTableData([tableData[tag][1] for tag in tableOrder])
     if not isinstance(pathOrFile, TTFont):
         font.close()
-        del font
     return tableData, compData, tableOrder, tableChecksums
 
 def getSFNTCollectionData(pathOrFiles, modifyNames=True, reverseNames=False, DSIG=False, duplicates=[], shared=[]):
     tables = []
+    # offsets of the tables written so far, by table data
     offsets = {}
     fonts = []
 
@@ -66,23 +97,22 @@ def getSFNTCollectionData(pathOrFiles, modifyNames=True, reverseNames=False, DSI
     if DSIG:
         header["version"] = 0x00020000
 
-    fontData = sstruct.pack(ttcHeaderFormat, header)
+    fontData = [sstruct.pack(ttcHeaderFormat, header)]
     offset = ttcHeaderSize + (numFonts * struct.calcsize(">L"))
     if DSIG:
         offset += 3 * struct.calcsize(">L")
 
-    for font in fonts:
-        fontData += struct.pack(">L", offset)
-        tags = [i for i in sorted(font.keys()) if len(i) == 4]
+    fontTags = [[i for i in sorted(font.keys()) if len(i) == 4] for font in fonts]
+
+    for tags in fontTags:
+        fontData.append(struct.pack(">L", offset))
         offset += sfntDirectorySize + (len(tags) * sfntDirectoryEntrySize)
 
     if DSIG:
         data = b"\0" * 4
         tables.append(data)
         offset += len(data)
-        fontData += struct.pack(">4s", b"DSIG")
-        fontData += struct.pack(">L", len(data))
-        fontData += struct.pack(">L", offset)
+        fontData.append(struct.pack(">4sLL", b"DSIG", len(data), offset))
 
     for i, font in enumerate(fonts):
         # Make the name table unique
@@ -101,58 +131,64 @@ def getSFNTCollectionData(pathOrFiles, modifyNames=True, reverseNames=False, DSI
                 elif nameID == 6:
                     namerecord.string = string.replace("-", "%d-" % index)
 
-        tags = [i for i in sorted(font.keys()) if len(i) == 4]
+        tags = fontTags[i]
 
         searchRange, entrySelector, rangeShift = getSearchRange(len(tags), 16)
-        offsetTable = dict(
-            sfntVersion=font.sfntVersion,
-            numTables=len(tags),
-            searchRange=searchRange,
-            entrySelector=entrySelector,
-            rangeShift=rangeShift,
-        )
-
-        fontData += sstruct.pack(sfntDirectoryFormat, offsetTable)
+        fontData.append(sfntDirectoryStruct.pack(
+            tobytes(font.sfntVersion), len(tags), searchRange, entrySelector, rangeShift
+        ))
 
+        reader = font.reader
+        readerTables = reader.tables
         for tag in tags:
-            data = font.getTableData(tag)
-            checksum = calcTableChecksum(tag, data)
-            entry = dict(
-                tag=tag,
-                offset=offset,
-                length=len(data),
-                checkSum=checksum,
-            )
-
-            if (shared and tag not in shared) or tag in duplicates or data not in tables:
+            if font.isLoaded(tag):
+                data = font.getTableData(tag)
+                checksum = calcTableChecksum(tag, data)
+            else:
+                # the table was never decompiled, so the raw data
+                # and checksum in the source directory still apply.
+                data = reader[tag]
+                checksum = readerTables[tag].checkSum
+            if (shared and tag not in shared) or tag in duplicates or data not in offsets:
                 tables.append(data)
-                offsets[checksum] = offset
+                offsets[data] = tableOffset = offset
                 offset += len(data) + calcPaddingLength(len(data))
             else:
-                entry["offset"] = offsets[checksum]
+                tableOffset = offsets[data]
 
-            fontData += sstruct.pack(sfntDirectoryEntryFormat, entry)
+            fontData.append(sfntDirectoryEntryStruct.pack(tobytes(tag), checksum, tableOffset, len(data)))
 
     for table in tables:
-        fontData += padData(table)
+        fontData.append(padData(table))
 
-    return fontData
+    return b"".join(fontData)
 
 def getWOFFCollectionData(pathOrFiles, MismatchGlyfLoca=False, reverseNames=False):
     from testCaseGeneratorLib.defaultData import defaultTestData
 
     tableChecksums = []
     tableData = []
+    # the transformed data of each entry in tableData, for compression
+    transformedData = []
     tableOrder = []
     collectionDirectory = []
     locaIndices = []
+    # index of each (tag, data) pair in tableData
+    tableDataIndices = {}
+    # repeated fonts, given as the same path or the same TTFont,
+    # only differ in the name table, so their other tables are
+    # transformed once.
+    transformCache = {}
     fonts = []
+    sources = []
 
     for pathOrFile in pathOrFiles:
         if isinstance(pathOrFile, TTFont):
             fonts.append(pathOrFile)
+            sources.append(id(pathOrFile))
         else:
             fonts.append(getTTFont(pathOrFile))
+            sources.append(os.path.realpath(pathOrFile))
 
     for i, font in enumerate(fonts):
         index = i
@@ -173,40 +209,45 @@ def getWOFFCollectionData(pathOrFiles, MismatchGlyfLoca=False, reverseNames=Fals
 
         tags = [i for i in sorted(font.keys()) if len(i) == 4]
         if "glyf" in tags:
-            glyf = tags.index("glyf")
-            loca = tags.index("loca")
-            tags.insert(glyf + 1, tags.pop(loca))
+            tags = _placeLocaNextToGlyf(tags)
         tableIndices = OrderedDict()
+        readerTables = font.reader.tables
         for tag in tags:
-            data = transformTable(font, tag)
+            if tag == "name":
+                data = transformTable(font, tag)
+            else:
+                key = (sources[i], tag)
+                data = transformCache.get(key)
+                if data is None:
+                    data = transformCache[key] = transformTable(font, tag)
             if MismatchGlyfLoca and tag in ("glyf", "loca"):
                 tableData.append([tag, data])
-                tableChecksums.append([tag, font.reader.tables[tag].checkSum])
+                transformedData.append(data[1])
+                tableChecksums.append([tag, readerTables[tag].checkSum])
                 tableOrder.append(tag)
                 tableIndex = len(tableData) - 1
                 tableIndices[tag] = tableIndex
                 if tag == "loca":
                     locaIndices.append(tableIndex)
             else:
-                if [tag, data] not in tableData:
+                tableIndex = tableDataIndices.get((tag, data))
+                if tableIndex is None:
                     tableData.append([tag, data])
-                    tableChecksums.append([tag, font.reader.tables[tag].checkSum])
+                    transformedData.append(data[1])
+                    tableChecksums.append([tag, readerTables[tag].checkSum])
                     tableOrder.append(tag)
-                tableIndices[tag] = tableData.index([tag, data])
+                    tableIndex = tableDataIndices[tag, data] = len(tableData) - 1
+                tableIndices[tag] = tableIndex
         collectionDirectory.append(dict(numTables=len(tableIndices),
                                         flavor=bytes(font.sfntVersion, "utf-8"),
                                         index=tableIndices))
         font.close()
-        del font
 
     if MismatchGlyfLoca:
         locaIndices.reverse()
         for i, entry in enumerate(collectionDirectory):
             entry["index"]["loca"] = locaIndices[i]
-    totalData = b"".join([data[1][1] for data in tableData])
-    compData = brotli.compress(totalData, brotli.MODE_FONT)
-    if len(compData) >= len(totalData):
-        compData = totalData
+    compData = compressTableData(transformedData)
 
     directory = [dict(tag=tag, origLength=0, transformLength=0, transformFlag=0) for tag in tableOrder]
 
@@ -253,29 +294,27 @@ def packSFNT(header, directory, tableData, flavor="cff",
     header["entrySelector"] = entrySelector
     header["rangeShift"] = rangeShift
     # version and num tables should already be set
-    sfntData = sstruct.pack(sfntDirectoryFormat, header)
+    sfntData = [sfntDirectoryStruct.pack(
+        tobytes(header["sfntVersion"]), header["numTables"],
+        header["searchRange"], header["entrySelector"], header["rangeShift"]
+    )]
     # compile the directory
     sfntDirectoryEntries = {}
     entryOrder = []
+    pack = sfntDirectoryEntryStruct.pack
     for entry in directory:
-        sfntEntry = SFNTDirectoryEntry()
-        sfntEntry.tag = entry["tag"]
-        sfntEntry.checkSum = entry["checksum"]
-        sfntEntry.offset = entry["offset"]
-        sfntEntry.length = entry["length"]
-        sfntDirectoryEntries[entry["tag"]] = sfntEntry
-        entryOrder.append(entry["tag"])
+        tag = entry["tag"]
+        sfntDirectoryEntries[tag] = pack(tobytes(tag), entry["checksum"], entry["offset"], entry["length"])
+        entryOrder.append(tag)
     if sortDirectory:
         entryOrder = sorted(entryOrder)
     for tag in entryOrder:
-        entry = sfntDirectoryEntries[tag]
-        sfntData += entry.toString()
+        sfntData.append(sfntDirectoryEntries[tag])
     # compile the data
-    directory = [(entry["offset"], entry["tag"]) for entry in directory]
-    for o, tag in sorted(directory):
-        data = tableData[tag]
+    for entry in sorted(directory, key=itemgetter("offset", "tag")):
+        data = tableData[entry["tag"]]
         if applyPadding:
             data = padData(data)
-        sfntData += data
+        sfntData.append(data)
     # done
-    return sfntData
+    return b"".join(sfntData)
@@ -6,17 +6,17 @@ import brotli
 import os
 import zlib
 import codecs
-import struct
 from copy import deepcopy
 from fontTools.ttLib import TTFont
 from fontTools.ttLib.sfnt import sfntDirectoryEntrySize
 from testCaseGeneratorLib.woff import base128Size, packTestHeader, packTestDirectory, packTestMetadata, packTestPrivateData,\
     woffHeaderSize, transformTable
 from testCaseGeneratorLib.defaultData import defaultTestData, defaultSFNTTestData, testDataWOFFMetadata, testDataWOFFPrivateData,\
-    sfntCFFTableData, testCFFDataWOFFDirectory
+    sfntCFFTableData, sfntCFFTransformedData, sfntTTFTransformedData, sfntTTFTransformedOffsets,\
+    testCFFDataWOFFDirectory
 from testCaseGeneratorLib.paths import sfntTTFSourcePath, sfntTTFCompositeSourcePath
-from testCaseGeneratorLib.utilities import calcPaddingLength, padData, calcTableChecksum, stripMetadata
-from testCaseGeneratorLib.sfnt import getSFNTData, packSFNT, getTTFont
+from testCaseGeneratorLib.utilities import calcPaddingLength, padData, calcTableChecksum, stripMetadata, brotliQuality
+from testCaseGeneratorLib.sfnt import getSFNTData, packSFNT, getTTFont, compressTableData
 
 def makeMetadataTest(metadata):
     """
@@ -212,12 +212,14 @@ makeHeaderIncorrectTotalSfntSize2Credits = [dict(title="Khaled Hosny", role="aut
 # File Structure: Data Blocks: Extraneous Data
 # --------------------------------------------
 
+# the extraneous data inserted by the test cases below
+bogusBytes = b"\0" * 4
+bogusByteLength = len(bogusBytes)
+
 # between header and table directory
 
 def makeExtraneousData0():
     header, directory, tableData = defaultTestData()
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     data = padData(packTestHeader(header) + bogusBytes + packTestDirectory(directory) + tableData)
     return data
@@ -230,8 +232,6 @@ makeExtraneousData0Credits =  [dict(title="Khaled Hosny", role="author", link="h
 
 def makeExtraneousData1():
     header, directory, tableData = defaultTestData()
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     data = padData(packTestHeader(header)
                    + packTestDirectory(directory)
@@ -247,8 +247,6 @@ makeExtraneousData1Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData2():
     header, directory, tableData = defaultTestData()
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + bogusBytes
     return data
@@ -261,8 +259,6 @@ makeExtraneousData2Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData3():
     header, directory, tableData, metadata = defaultTestData(metadata=testDataWOFFMetadata)
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     header["metaOffset"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + bogusBytes + packTestMetadata(metadata)
@@ -276,8 +272,6 @@ makeExtraneousData3Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData4():
     header, directory, tableData, privateData = defaultTestData(privateData=testDataWOFFPrivateData)
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     header["privOffset"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + bogusBytes + packTestPrivateData(privateData)
@@ -291,8 +285,6 @@ makeExtraneousData4Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData5():
     header, directory, tableData, metadata, privateData = defaultTestData(metadata=testDataWOFFMetadata, privateData=testDataWOFFPrivateData)
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     header["privOffset"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + packTestMetadata(metadata, havePrivateData=True) + bogusBytes + packTestPrivateData(privateData)
@@ -306,8 +298,6 @@ makeExtraneousData5Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData6():
     header, directory, tableData, metadata = defaultTestData(metadata=testDataWOFFMetadata)
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + packTestMetadata(metadata) + bogusBytes
     return data
@@ -320,8 +310,6 @@ makeExtraneousData6Credits = [dict(title="Tal Leming", role="author", link="http
 
 def makeExtraneousData7():
     header, directory, tableData, privateData = defaultTestData(privateData=testDataWOFFPrivateData)
-    bogusByteLength = 4
-    bogusBytes = b"\0" * bogusByteLength
     header["length"] += bogusByteLength
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData) + packTestPrivateData(privateData) + bogusBytes
     return data
@@ -335,15 +323,18 @@ makeExtraneousData7Credits = [dict(title="Tal Leming", role="author", link="http
 def makeExtraneousData8():
     header, directory, tableData = defaultTestData()
 
+    # replace the last table with two copies of it, joined
+    # from a view so the default stream is not sliced first
     table = sfntCFFTableData[directory[-1]["tag"]][0]
-    tableData = brotli.decompress(tableData)
-    tableData = brotli.compress(tableData[:-len(table)] + table + table)
+    tableData = b"".join([memoryview(sfntCFFTransformedData)[:-len(table)], table, table])
+    tableData = brotli.compress(tableData, quality=brotliQuality)
 
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
     header["totalCompressedSize"] = len(tableData)
 
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 makeExtraneousData8Title = "Extraneous Data Betwen Table Data"
@@ -405,12 +396,13 @@ makeOverlappingData3Credits = [dict(title="Tal Leming", role="author", link="htt
 
 def makeTableBrotliCompressionTest1():
     header, directory, tableData = defaultTestData()
-    zlibData = zlib.compress(brotli.decompress(tableData))
-    length = woffHeaderSize + len(packTestDirectory(directory)) + len(zlibData)
+    zlibData = zlib.compress(sfntCFFTransformedData)
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(zlibData)
     length += calcPaddingLength(length)
     header["totalCompressedSize"] = len(zlibData)
     header["length"] = length
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + zlibData)
+    data = padData(packTestHeader(header) + directoryData + zlibData)
     return data
 
 makeTableBrotliCompressionTest1Title = "Font Table Data Invalid Compressed Data"
@@ -450,6 +442,7 @@ def makeTableDecompressedLengthTest3():
     for entry in directory:
         if entry["tag"] == "glyf":
             entry["transformLength"] += 1
+            break
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
     return data
 
@@ -462,6 +455,7 @@ def makeTableDecompressedLengthTest4():
     for entry in directory:
         if entry["tag"] == "glyf":
             entry["transformLength"] -= 1
+            break
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
     return data
 
@@ -485,20 +479,20 @@ def getModifiedSFNTData(path=sfntTTFSourcePath, noTransform=False, nonZeroLoca=F
     tableChecksums = {}
     tableData = {}
     tableOrder = [i for i in sorted(font.keys()) if len(i) == 4]
+    readerTables = font.reader.tables
     for tag in tableOrder:
-        tableChecksums[tag] = font.reader.tables[tag].checkSum
+        tableChecksums[tag] = readerTables[tag].checkSum
         if nonZeroLoca and tag == "loca":
             tableData[tag] = (font.getTableData(tag), b"\0" * 4)
         elif longLoca and tag == "loca":
             tableData[tag] = (b"\0" * len(loca) * 4, b"")
         elif noTransform:
-            tableData[tag] = (font.getTableData(tag), font.getTableData(tag))
+            # untransformed, the stored data is the original data
+            data = font.getTableData(tag)
+            tableData[tag] = (data, data)
         else:
             tableData[tag] = transformTable(font, tag)
-    totalData = b"".join([tableData[tag][1] for tag in tableOrder])
-    compData = brotli.compress(totalData, brotli.MODE_FONT)
-    if len(compData) >= len(totalData):
-        compData = totalData
+    compData = compressTableData([tableData[tag][1] for tag in tableOrder])
     font.close()
     del font
     return tableData, compData, tableOrder, tableChecksums
@@ -549,7 +543,6 @@ makeLocaSizeTest3Description = "A valid CFF flavoured font which naturally have
 makeLocaSizeTest3Credits = [dict(title="Khaled Hosny", role="author", link="http://khaledhosny.org")]
 
 def makeValidLoca1():
-    from testCaseGeneratorLib.sfnt import getSFNTData
     tableData, compressedData, tableOrder, tableChecksums = getSFNTData(sfntTTFCompositeSourcePath)
     header, directory, tableData = defaultTestData(tableData=tableData, compressedData=compressedData, flavor="ttf")
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
@@ -583,35 +576,36 @@ makeGlyfBBox1Credits = [dict(title="Khaled Hosny", role="author", link="http://k
 
 def makeLSB1():
     woffHeader, woffDirectory, woffCompressedTableData = defaultTestData(flavor="TTF")
-    woffTableData = brotli.decompress(woffCompressedTableData)
-    offset = 0
+    woffTableData = sfntTTFTransformedData
+    offset = sfntTTFTransformedOffsets["hmtx"]
     for entry in woffDirectory:
         if entry["tag"] == "hmtx":
             assert entry["transformFlag"] == 1
             flags = woffTableData[offset]
             assert flags & (1 << 0)
             assert flags & (1 << 1)
-        offset += entry["transformLength"]
+            break
     header, directory, tableData = defaultSFNTTestData(flavor="TTF")
     data = packSFNT(header, directory, tableData, flavor="TTF")
     return data
 
 def makeHmtxTransform1():
     header, directory, tableData = defaultTestData(flavor="TTF")
-    decompressedTableData = brotli.decompress(tableData)
-    offset = 0
+    decompressedTableData = sfntTTFTransformedData
+    offset = sfntTTFTransformedOffsets["hmtx"]
     for entry in directory:
         if entry["tag"] == "hmtx":
             assert entry["transformFlag"] == 1
             flags = decompressedTableData[offset]
             assert flags & (1 << 0)
             assert flags & (1 << 1)
-        offset += entry["transformLength"]
+            break
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
     return data
 
 def makeGlyfOverlapBitmapSFNT():
-    font = getTTFont(sfntTTFSourcePath, recalcBBoxes=True)
+    # only the flags change, so the source bounding boxes stay valid
+    font = getTTFont(sfntTTFSourcePath, recalcBBoxes=False)
     glyf = font["glyf"]
 
     for glyphName in glyf.keys():
@@ -627,7 +621,7 @@ def makeGlyfOverlapBitmapSFNT():
     return data
 
 def makeGlyfNoOverlapBitmapSFNT():
-    font = getTTFont(sfntTTFSourcePath, recalcBBoxes=True)
+    font = getTTFont(sfntTTFSourcePath, recalcBBoxes=False)
     tableData = getSFNTData(font)[0]
     font.close()
     del font
@@ -638,46 +632,34 @@ def makeGlyfNoOverlapBitmapSFNT():
 
 def makeGlyfOverlapBitmap():
     header, directory, tableData = defaultTestData(flavor="TTF")
-    decompressedTableData = brotli.decompress(tableData)
-    offset = 0
+    decompressedTableData = bytearray(sfntTTFTransformedData)
+    offset = sfntTTFTransformedOffsets["glyf"]
     for entry in directory:
         if entry["tag"] == "glyf":
             assert entry["transformFlag"] == 0
             flagsOffset = offset + 3
             nextTableOffset = offset + entry["transformLength"]
 
-            flags = decompressedTableData[flagsOffset]
-            flags |= (1 << 0)
-
-            decompressedTableData = (decompressedTableData[:flagsOffset]
-                                     + struct.pack(">B", flags)
-                                     + decompressedTableData[flagsOffset + 1:nextTableOffset]
-                                     + struct.pack(">B", 0b00110000)
-                                     + decompressedTableData[nextTableOffset:])
+            decompressedTableData[flagsOffset] |= (1 << 0)
+            decompressedTableData.insert(nextTableOffset, 0b00110000)
 
             entry["transformLength"] += 1
+            break
 
-        offset += entry["transformLength"]
+    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT, brotliQuality)
 
-    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT)
-
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
     header["totalCompressedSize"] = len(tableData)
 
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 def makeGlyfNoOverlapBitmap():
+    # recompressing the unmodified table data gives the default
+    # compressed data and lengths, so those are used as they are
     header, directory, tableData = defaultTestData(flavor="TTF")
-    decompressedTableData = brotli.decompress(tableData)
-
-    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT)
-
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
-    header["totalCompressedSize"] = len(tableData)
-
     data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
     return data
 
@@ -687,26 +669,25 @@ makeHmtxTransform1Credits = [dict(title="Khaled Hosny", role="author", link="htt
 
 def makeHmtxTransform2():
     header, directory, tableData = defaultTestData(flavor="TTF")
-    decompressedTableData = brotli.decompress(tableData)
-    offset = 0
+    decompressedTableData = bytearray(sfntTTFTransformedData)
+    offset = sfntTTFTransformedOffsets["hmtx"]
     for entry in directory:
         if entry["tag"] == "hmtx":
             assert entry["transformFlag"] == 1
-            flags = decompressedTableData[offset]
-            for bit in range(2, 8):
-                flags |= 1 << bit
-            decompressedTableData = decompressedTableData[:offset] + struct.pack(">B", flags) + decompressedTableData[offset+1:]
+            # set the reserved bits 2 to 7
+            decompressedTableData[offset] |= 0xFC
             flags = decompressedTableData[offset]
             assert flags == 255
-        offset += entry["transformLength"]
+            break
 
-    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT)
+    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT, brotliQuality)
 
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
     header["totalCompressedSize"] = len(tableData)
 
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 makeHmtxTransform2Title = "Transformed Hmtx Table With All Flags Set"
@@ -715,23 +696,24 @@ makeHmtxTransform2Credits = [dict(title="Khaled Hosny", role="author", link="htt
 
 def makeHmtxTransform3():
     header, directory, tableData = defaultTestData(flavor="TTF")
-    decompressedTableData = brotli.decompress(tableData)
-    offset = 0
+    decompressedTableData = bytearray(sfntTTFTransformedData)
+    offset = sfntTTFTransformedOffsets["hmtx"]
     for entry in directory:
         if entry["tag"] == "hmtx":
             assert entry["transformFlag"] == 1
-            decompressedTableData = decompressedTableData[:offset] + b"\0" + decompressedTableData[offset+1:]
+            decompressedTableData[offset] = 0
             flags = decompressedTableData[offset]
             assert flags == 0
-        offset += entry["transformLength"]
+            break
 
-    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT)
+    tableData = brotli.compress(decompressedTableData, brotli.MODE_FONT, brotliQuality)
 
-    header["length"] = woffHeaderSize + len(packTestDirectory(directory)) + len(tableData)
-    header["length"] += calcPaddingLength(header["length"])
+    directoryData = packTestDirectory(directory)
+    length = woffHeaderSize + len(directoryData) + len(tableData)
+    header["length"] = length + calcPaddingLength(length)
     header["totalCompressedSize"] = len(tableData)
 
-    data = padData(packTestHeader(header) + packTestDirectory(directory) + tableData)
+    data = padData(packTestHeader(header) + directoryData + tableData)
     return data
 
 makeHmtxTransform3Title = "Transformed Hmtx Table With 0 Flags"
@@ -959,8 +941,9 @@ metadataEncoding2Metadata = """
     <uniqueid id="org.w3.webfonts.wofftest" />
 </metadata>
 """.strip().replace("    ", "\t").encode("utf-16")
-if metadataEncoding2Metadata.startswith(codecs.BOM_UTF16):
-    metadataEncoding2Metadata = metadataEncoding2Metadata.replace(codecs.BOM_UTF16, b"")
+# the utf-16 codec always writes a BOM, drop it
+assert metadataEncoding2Metadata.startswith(codecs.BOM_UTF16)
+metadataEncoding2Metadata = metadataEncoding2Metadata[len(codecs.BOM_UTF16):]
 metadataEncoding2Title = "Invalid Encoding: UTF-16"
 metadataEncoding2Description = "The xml encoding is set to UTF-16."
 metadataEncoding2Credits = [dict(title="Tal Leming", role="author", link="http://typesupply.com")]
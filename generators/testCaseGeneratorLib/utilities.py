@@ -2,11 +2,28 @@
 Miscellaneous utilities.
 """
 
+import os
+import sys
+import array
 import struct
-from fontTools.misc import sstruct
+from operator import itemgetter
 from fontTools.ttLib import getSearchRange
-from fontTools.ttLib.sfnt import calcChecksum,\
-    SFNTDirectoryEntry, sfntDirectoryFormat, sfntDirectorySize, sfntDirectoryEntryFormat, sfntDirectoryEntrySize
+from fontTools.misc.textTools import tobytes
+from fontTools.ttLib.sfnt import calcChecksum, sfntDirectorySize, sfntDirectoryEntrySize
+
+# same layouts as sfntDirectoryFormat and sfntDirectoryEntryFormat
+sfntDirectoryStruct = struct.Struct(">4sHHHH")
+sfntDirectoryEntryStruct = struct.Struct(">4sLLL")
+
+# -----------
+# Compression
+# -----------
+
+# brotli quality used for the table data. The published test
+# fonts use the maximum, a lower value can be set in the
+# WOFF2_BROTLI_QUALITY environment variable to speed up
+# local runs, at the cost of different compressed data.
+brotliQuality = int(os.environ.get("WOFF2_BROTLI_QUALITY", 11))
 
 # -------
 # Padding
@@ -16,9 +33,7 @@ def calcPaddingLength(length):
     """
     Calculate how much padding is needed for 4-byte alignment.
     """
-    if not length % 4:
-        return 0
-    return 4 - (length % 4)
+    return -length % 4
 
 def padData(data):
     """
@@ -31,8 +46,19 @@ def padData(data):
 # Checksums
 # ---------
 
+# array type code for unsigned 32-bit values on this platform
+for ulongTypeCode in ("I", "L"):
+    if array.array(ulongTypeCode).itemsize == 4:
+        break
+else:
+    raise ImportError("No 4-byte unsigned array type code is available on this platform.")
+
 def sumDataULongs(data):
-    longs = struct.unpack(">%dL" % (len(data) / 4), data)
+    # array reads the words in native byte order and sum runs
+    # over the array directly, without building a tuple of ints.
+    longs = array.array(ulongTypeCode, data)
+    if sys.byteorder == "little":
+        longs.byteswap()
     value = sum(longs) % (2 ** 32)
     return value
 
@@ -97,27 +123,16 @@ def calcHeadCheckSumAdjustmentSFNT(directory, tableData, flavor=None):
     assert flavor in (b"OTTO", b"\000\001\000\000")
     # make the sfnt header
     searchRange, entrySelector, rangeShift = getSearchRange(len(directory), 16)
-    sfntHeaderData = dict(
-        sfntVersion=flavor,
-        numTables=len(directory),
-        searchRange=searchRange,
-        entrySelector=entrySelector,
-        rangeShift=rangeShift
-    )
-    sfntData = sstruct.pack(sfntDirectoryFormat, sfntHeaderData)
+    sfntData = [sfntDirectoryStruct.pack(tobytes(flavor), len(directory), searchRange, entrySelector, rangeShift)]
     # make a SFNT table directory
-    directory = [(entry["tag"], entry) for entry in directory]
-    for tag, entry in sorted(directory):
-        sfntEntry = SFNTDirectoryEntry()
-        sfntEntry.tag = entry["tag"]
-        sfntEntry.checkSum = entry["checksum"]
-        sfntEntry.offset = entry["offset"]
-        sfntEntry.length = entry["length"]
-        sfntData += sfntEntry.toString()
+    pack = sfntDirectoryEntryStruct.pack
+    for entry in sorted(directory, key=itemgetter("tag")):
+        sfntData.append(pack(tobytes(entry["tag"]), entry["checksum"], entry["offset"], entry["length"]))
+    sfntData = b"".join(sfntData)
     # calculate the checksum
     sfntDataChecksum = calcChecksum(sfntData)
     # gather all of the checksums
-    checksums = [entry["checksum"] for o, entry in directory]
+    checksums = [entry["checksum"] for entry in directory]
     checksums.append(sfntDataChecksum)
     # calculate the checksum
     checkSumAdjustment = sum(checksums)
@@ -3,9 +3,11 @@ WOFF data packers.
 """
 
 import struct
+import functools
 from copy import deepcopy
 from fontTools.misc import sstruct
 from fontTools.misc.arrayTools import calcIntBounds
+from fontTools.misc.textTools import tobytes
 from testCaseGeneratorLib.utilities import padData, calcHeadCheckSumAdjustment
 
 # ------------------
@@ -30,6 +32,11 @@ woffHeaderFormat = """
     privLength:     L
 """
 woffHeaderSize = sstruct.calcsize(woffHeaderFormat)
+# same layout as woffHeaderFormat
+woffHeaderStruct = struct.Struct(">4s4sLHHLLHHLLLLL")
+
+# single unsigned bytes, packed per point and per base128 digit
+uint8Struct = struct.Struct(">B")
 
 woffTransformedGlyfHeaderFormat = """
     > # big endian
@@ -103,7 +110,7 @@ def transformTable(font, tag, glyphBBox="", alt255UInt16=False):
 
 def pack255UInt16(n, alternate=0):
     if n < 253:
-        ret = struct.pack(">B", n)
+        ret = uint8Struct.pack(n)
     elif n < 506:
         ret = struct.pack(">BB", 255, n - 253)
     elif n < 762:
@@ -134,33 +141,32 @@ def packTriplet(x, y, onCurve):
         ySignBit = 1
     xySignBits = xSignBit + 2 * ySignBit
 
-    fmt = ">B"
     flags = b""
     glyphs = b""
     if x == 0 and absY < 1280:
-        flags += struct.pack(fmt, onCurveBit + ((absY & 0xf00) >> 7) + ySignBit)
-        glyphs += struct.pack(fmt, absY & 0xff)
+        flags += uint8Struct.pack(onCurveBit + ((absY & 0xf00) >> 7) + ySignBit)
+        glyphs += uint8Struct.pack(absY & 0xff)
     elif y == 0 and absX < 1280:
-        flags += struct.pack(fmt, onCurveBit + 10 + ((absX & 0xf00) >> 7) + xSignBit)
-        glyphs += struct.pack(fmt, absX & 0xff)
+        flags += uint8Struct.pack(onCurveBit + 10 + ((absX & 0xf00) >> 7) + xSignBit)
+        glyphs += uint8Struct.pack(absX & 0xff)
     elif absX < 65 and absY < 65:
-        flags += struct.pack(fmt, onCurveBit + 20 + ((absX - 1) & 0x30) + (((absY - 1) & 0x30) >> 2) + xySignBits)
-        glyphs += struct.pack(fmt, (((absX - 1) & 0xf) << 4) | ((absY - 1) & 0xf))
+        flags += uint8Struct.pack(onCurveBit + 20 + ((absX - 1) & 0x30) + (((absY - 1) & 0x30) >> 2) + xySignBits)
+        glyphs += uint8Struct.pack((((absX - 1) & 0xf) << 4) | ((absY - 1) & 0xf))
     elif absX < 769 and absY < 769:
-        flags += struct.pack(fmt, onCurveBit + 84 + 12 * (((absX - 1) & 0x300) >> 8) + (((absY - 1) & 0x300) >> 6) + xySignBits)
-        glyphs += struct.pack(fmt, (absX - 1) & 0xff)
-        glyphs += struct.pack(fmt, (absY - 1) & 0xff)
+        flags += uint8Struct.pack(onCurveBit + 84 + 12 * (((absX - 1) & 0x300) >> 8) + (((absY - 1) & 0x300) >> 6) + xySignBits)
+        glyphs += uint8Struct.pack((absX - 1) & 0xff)
+        glyphs += uint8Struct.pack((absY - 1) & 0xff)
     elif absX < 4096 and absY < 4096:
-        flags += struct.pack(fmt, onCurveBit + 120 + xySignBits)
-        glyphs += struct.pack(fmt, absX >> 4)
-        glyphs += struct.pack(fmt, ((absX & 0xf) << 4) | (absY >> 8))
-        glyphs += struct.pack(fmt, absY & 0xff)
+        flags += uint8Struct.pack(onCurveBit + 120 + xySignBits)
+        glyphs += uint8Struct.pack(absX >> 4)
+        glyphs += uint8Struct.pack(((absX & 0xf) << 4) | (absY >> 8))
+        glyphs += uint8Struct.pack(absY & 0xff)
     else:
-        flags += struct.pack(fmt, onCurveBit + 124 + xySignBits)
-        glyphs += struct.pack(fmt, absX >> 8)
-        glyphs += struct.pack(fmt, absX & 0xff)
-        glyphs += struct.pack(fmt, absY >> 8)
-        glyphs += struct.pack(fmt, absY & 0xff)
+        flags += uint8Struct.pack(onCurveBit + 124 + xySignBits)
+        glyphs += uint8Struct.pack(absX >> 8)
+        glyphs += uint8Struct.pack(absX & 0xff)
+        glyphs += uint8Struct.pack(absY >> 8)
+        glyphs += uint8Struct.pack(absY & 0xff)
 
     return (flags, glyphs)
 
@@ -168,13 +174,15 @@ def transformGlyf(font, glyphBBox="", alt255UInt16=False):
     glyf = font["glyf"]
     head = font["head"]
 
-    nContourStream = b""
-    nPointsStream = b""
-    flagStream = b""
-    glyphStream = b""
-    compositeStream = b""
-    bboxStream = b""
-    instructionStream = b""
+    # the streams grow a few bytes at a time, so they are
+    # built in place and joined once at the end.
+    nContourStream = bytearray()
+    nPointsStream = bytearray()
+    flagStream = bytearray()
+    glyphStream = bytearray()
+    compositeStream = bytearray()
+    bboxStream = bytearray()
+    instructionStream = bytearray()
     bboxBitmap = []
     bboxBitmapStream = b""
 
@@ -265,7 +273,7 @@ def transformGlyf(font, glyphBBox="", alt255UInt16=False):
             # bboxStream
             bboxStream += struct.pack(">hhhh", glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax)
 
-    bboxBitmapStream = b"".join([struct.pack(">B", v) for v in bboxBitmap])
+    bboxBitmapStream = b"".join([uint8Struct.pack(v) for v in bboxBitmap])
 
     header = deepcopy(woffTransformedGlyfHeader)
     header["numGlyphs"] = len(glyf.keys())
@@ -278,11 +286,13 @@ def transformGlyf(font, glyphBBox="", alt255UInt16=False):
     header["bboxStreamSize"] = len(bboxStream) + len(bboxBitmapStream)
     header["instructionStreamSize"] = len(instructionStream)
 
-    data = sstruct.pack(woffTransformedGlyfHeaderFormat, header)
-    data += nContourStream + nPointsStream + flagStream
-    data += glyphStream + compositeStream
-    data += bboxBitmapStream + bboxStream
-    data += instructionStream
+    data = b"".join([
+        sstruct.pack(woffTransformedGlyfHeaderFormat, header),
+        nContourStream, nPointsStream, flagStream,
+        glyphStream, compositeStream,
+        bboxBitmapStream, bboxStream,
+        instructionStream
+    ])
 
     return data
 
@@ -325,7 +335,7 @@ def transformHmtx(font):
     if not hasLeftSideBearing:
         flags |= 1 << 1
 
-    data = struct.pack(">B", flags)
+    data = uint8Struct.pack(flags)
     for index, name in enumerate(hmtx.metrics):
         if index >= hhea.numberOfHMetrics:
             break
@@ -360,16 +370,22 @@ def packBase128(n, bug=False):
     size = base128Size(n)
     ret = b""
     if bug:
-        ret += struct.pack(">B", 0x80)
+        ret += uint8Struct.pack(0x80)
     for i in range(size):
         b = (n >> (7 * (size - i - 1))) & 0x7f
         if i < size - 1:
             b = b | 0x80
-        ret += struct.pack(">B", b)
+        ret += uint8Struct.pack(b)
     return ret
 
 def packTestHeader(header):
-    return sstruct.pack(woffHeaderFormat, header)
+    return woffHeaderStruct.pack(
+        tobytes(header["signature"]), tobytes(header["flavor"]), header["length"],
+        header["numTables"], header["reserved"], header["totalSfntSize"],
+        header["totalCompressedSize"], header["majorVersion"], header["minorVersion"],
+        header["metaOffset"], header["metaLength"], header["metaOrigLength"],
+        header["privOffset"], header["privLength"]
+    )
 
 def _setTransformBits(flag, tranasform):
     if tranasform == 1:
@@ -380,8 +396,32 @@ def _setTransformBits(flag, tranasform):
         flag |= 1 << 6 | 1 << 7
     return flag
 
+@functools.lru_cache(maxsize=None)
+def _packTestDirectoryEntry(tag, transformFlag, origLength, transformLength, known, skipTransformLength, Base128Bug):
+    """
+    Pack one directory entry. The test cases mostly vary a
+    few entries of the same directory, so entries are cached.
+    """
+    assert transformFlag <= 3
+    if known:
+        data = uint8Struct.pack(_setTransformBits(knownTableTags.index(tag), transformFlag))
+    else:
+        data = uint8Struct.pack(_setTransformBits(unknownTableTagFlag, transformFlag))
+        data += struct.pack(">4s", bytes(tag, "utf-8"))
+    data += packBase128(origLength, bug=Base128Bug)
+    transformed = False
+    if tag in transformedTables:
+        transformed = True
+        if transformFlag == 3:
+            transformed = False
+    else:
+        transformed = transformFlag != 0
+
+    if transformed and not skipTransformLength:
+        data += packBase128(transformLength, bug=Base128Bug)
+    return data
+
 def packTestDirectory(directory, knownTags=knownTableTags, skipTransformLength=False, isCollection=False, unsortGlyfLoca=False, Base128Bug=False):
-    data = b""
     directory = [(entry["tag"], entry) for entry in directory]
     if not isCollection:
        directory = sorted(directory, key=lambda t: t[0])
@@ -394,26 +434,12 @@ def packTestDirectory(directory, knownTags=knownTableTags, skipTransformLength=F
         assert loca
         assert glyf
         directory.insert(glyf, directory.pop(loca))
-    for tag, table in directory:
-        transformFlag = table["transformFlag"]
-        assert transformFlag <= 3
-        if tag in knownTags:
-            data += struct.pack(">B", _setTransformBits(knownTableTags.index(tag), transformFlag))
-        else:
-            data += struct.pack(">B", _setTransformBits(unknownTableTagFlag, transformFlag))
-            data += struct.pack(">4s", bytes(tag, "utf-8"))
-        data += packBase128(table["origLength"], bug=Base128Bug)
-        transformed = False
-        if tag in transformedTables:
-            transformed = True
-            if transformFlag == 3:
-                transformed = False
-        else:
-            transformed = transformFlag != 0
-
-        if transformed and not skipTransformLength:
-            data += packBase128(table["transformLength"], bug=Base128Bug)
-    return data
+    data = [
+        _packTestDirectoryEntry(tag, table["transformFlag"], table["origLength"], table["transformLength"],
+            tag in knownTags, skipTransformLength, Base128Bug)
+        for tag, table in directory
+    ]
+    return b"".join(data)
 
 def packTestCollectionHeader(header):
     return struct.pack(">L", header["version"]) + pack255UInt16(header["numFonts"])